@@ -14,19 +14,28 @@ os.chdir(script_dir)
 os.environ["no_proxy"] = "localhost,127.0.0.1"
 os.environ["NO_PROXY"] = "localhost,127.0.0.1"
 
+import asyncio
+import bisect
+import functools
+import io
 import json
 import logging
 import pickle
+import struct
+import subprocess
 import tempfile
+import threading
 import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Literal
+from types import MappingProxyType
+from typing import Any, AsyncGenerator, Optional, Literal
 
+import numpy as np
 import soundfile as sf
 from fastapi import FastAPI, HTTPException, Response
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from pydub import AudioSegment
 
 # Configure logging
 logging.basicConfig(
@@ -59,6 +68,184 @@ app = FastAPI(
 
 SAVED_VOICES_DIR = Path("saved_voices")
 
+# Dynamic batching: the worker waits up to BATCH_MAX_WAIT_MS after the first
+# queued request for others to arrive, and fuses at most BATCH_MAX_SIZE of them
+# into a single generate call.
+BATCH_MAX_WAIT_MS = int(os.environ.get("QWEN_TTS_BATCH_MAX_WAIT_MS", "30"))
+BATCH_MAX_SIZE = int(os.environ.get("QWEN_TTS_BATCH_MAX_SIZE", "8"))
+
+# Upper bounds (exclusive, in characters) of the text-length buckets. Requests
+# are only batched with others of similar length to keep padding waste low;
+# the last bucket takes everything up to the request max_length.
+LENGTH_BUCKETS = (64, 192, 512, 5000)
+
+
+# /tts/stream: crossfade between sentence chunks and encoder read size
+STREAM_CROSSFADE_MS = 30
+STREAM_READ_SIZE = 16384
+
+
+def bucket_for(length: int) -> int:
+    """Return the index of the length bucket for a text of `length` chars."""
+    return bisect.bisect_right(LENGTH_BUCKETS[:-1], length)
+
+
+MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "m4a": "audio/mp4",
+    "mp3": "audio/mpeg",
+    "ogg": "audio/ogg",
+    "flac": "audio/flac"
+}
+
+# ffmpeg encoder settings per output format
+FFMPEG_CODECS = {
+    "m4a": "aac",
+    "mp3": "libmp3lame",
+    "ogg": "libvorbis",
+    "flac": "flac",
+}
+FFMPEG_CONTAINERS = {
+    "m4a": "mp4",
+    "mp3": "mp3",
+    "ogg": "ogg",
+    "flac": "flac",
+}
+# The mp4 muxer cannot seek back on a pipe, so write a fragmented file
+FFMPEG_EXTRA_ARGS = {
+    "m4a": ["-movflags", "frag_keyframe+empty_moov"],
+}
+# Qwen3-TTS 12Hz models decode to 24 kHz; encoders for it are pre-spawned at startup
+FFMPEG_PREWARM_SAMPLE_RATE = 24000
+
+
+def _encode_wav(pcm: np.ndarray, sr: int) -> bytes:
+    """Encode PCM samples to an in-memory WAV file."""
+    buf = io.BytesIO()
+    sf.write(buf, pcm, sr, format="WAV")
+    return buf.getvalue()
+
+
+def _ffmpeg_encode_cmd(sr: int, fmt: str) -> list[str]:
+    """ffmpeg command reading mono float32 PCM on stdin and writing `fmt` to stdout."""
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "f32le", "-ar", str(sr), "-ac", "1", "-i", "pipe:0",
+        "-c:a", FFMPEG_CODECS[fmt], "-b:a", "192k",
+        *FFMPEG_EXTRA_ARGS.get(fmt, []),
+        "-f", FFMPEG_CONTAINERS[fmt], "pipe:1",
+    ]
+
+
+def _spawn_encoder(sr: int, fmt: str) -> subprocess.Popen:
+    """
+    Start an ffmpeg encoder that waits for PCM on stdin.
+
+    Uses subprocess rather than asyncio subprocesses, which the
+    SelectorEventLoop uvicorn runs on Windows with --reload doesn't support;
+    blocking pipe I/O is moved off the event loop by the callers.
+    """
+    return subprocess.Popen(
+        _ffmpeg_encode_cmd(sr, fmt),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+
+def _kill_encoder(proc: subprocess.Popen) -> None:
+    """Kill an encoder if it is still running and reap it."""
+    if proc.poll() is None:
+        proc.kill()
+    proc.wait()
+
+
+class FFmpegPool:
+    """
+    Keeps one pre-spawned, idle ffmpeg encoder per (format, sample rate).
+
+    Container formats need a fresh encoder per output file, so processes are
+    single-use; the pool takes process start-up off the request path by
+    handing out the warm process and spawning its replacement in the
+    background.
+    """
+
+    def __init__(self):
+        self._idle: dict[tuple[str, int], asyncio.Task] = {}
+
+    def prewarm(self, sr: int, fmt: str) -> None:
+        """Spawn an idle encoder for (fmt, sr) if none is waiting."""
+        key = (fmt, sr)
+        if key not in self._idle:
+            self._idle[key] = asyncio.create_task(asyncio.to_thread(_spawn_encoder, sr, fmt))
+
+    async def acquire(self, sr: int, fmt: str) -> subprocess.Popen:
+        """Take a ready encoder for (fmt, sr), spawning one if none is warm."""
+        proc = None
+        task = self._idle.pop((fmt, sr), None)
+        if task is not None:
+            try:
+                proc = await task
+            except Exception:
+                proc = None
+            if proc is not None and proc.poll() is not None:
+                proc = None
+        if proc is None:
+            proc = await asyncio.to_thread(_spawn_encoder, sr, fmt)
+        self.prewarm(sr, fmt)
+        return proc
+
+    async def close(self) -> None:
+        """Kill all idle encoders."""
+        tasks, self._idle = list(self._idle.values()), {}
+        for proc in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(proc, subprocess.Popen):
+                await asyncio.to_thread(_kill_encoder, proc)
+
+
+async def encode_audio(pcm: np.ndarray, sr: int, fmt: str) -> bytes:
+    """
+    Encode mono PCM samples to `fmt` with a single ffmpeg process.
+
+    Samples are piped in as raw float32 to a pre-spawned encoder from the
+    FFmpegPool and the encoded file is read back from stdout, so nothing
+    touches the disk; the exchange runs in a worker thread so the event loop
+    stays free while ffmpeg runs.
+
+    Raises:
+        RuntimeError: If ffmpeg exits with an error
+    """
+    proc = await app.state.ffmpeg_pool.acquire(sr, fmt)
+    stdout, stderr = await asyncio.to_thread(
+        proc.communicate, np.asarray(pcm, dtype=np.float32).tobytes()
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(
+            stderr.decode(errors="replace").strip()
+            or f"ffmpeg exited with {proc.returncode}"
+        )
+    return stdout
+
+
+def _pump_encoder_output(
+    proc: subprocess.Popen, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue
+) -> None:
+    """
+    Reader thread for a streaming encoder: forward stdout to `queue` as it
+    arrives, then None at EOF.
+
+    A dedicated thread rather than the default executor, so a read blocked
+    on ffmpeg can never starve the writes that would unblock it.
+    """
+    assert proc.stdout is not None
+    fd = proc.stdout.fileno()
+    try:
+        # os.read returns whatever is available instead of waiting for a full block
+        while data := os.read(fd, STREAM_READ_SIZE):
+            loop.call_soon_threadsafe(queue.put_nowait, data)
+    finally:
+        loop.call_soon_threadsafe(queue.put_nowait, None)
+
 
 class TTSRequest(BaseModel):
     """Request model for TTS generation."""
@@ -82,6 +269,510 @@ class TTSResponse(BaseModel):
     voice_info: Optional[dict] = None
 
 
+@dataclass
+class TTSJob:
+    """A queued TTS request waiting for the batch worker."""
+    request: TTSRequest
+    voice_type: str
+    model_name: str
+    language: str
+    future: asyncio.Future = field(repr=False)
+
+    @property
+    def gen_params(self) -> tuple:
+        """Sampling parameters; a batch shares one set."""
+        r = self.request
+        return (r.temperature, r.top_k, r.top_p, r.repetition_penalty, r.max_new_tokens)
+
+    @property
+    def batch_key(self) -> tuple:
+        """Jobs sharing this key can be fused into one generate call."""
+        return (
+            self.model_name,
+            self.voice_type,
+            self.language,
+            self.request.format,
+            self.gen_params,
+        )
+
+
+@functools.lru_cache(maxsize=256)
+def _gen_kwargs(
+    temperature: float,
+    top_k: int,
+    top_p: float,
+    repetition_penalty: float,
+    max_new_tokens: int,
+) -> MappingProxyType:
+    """Read-only generate kwargs, built once per distinct sampling setting."""
+    return MappingProxyType(dict(
+        temperature=temperature,
+        top_k=top_k,
+        top_p=top_p,
+        repetition_penalty=repetition_penalty,
+        max_new_tokens=max_new_tokens,
+        subtalker_temperature=temperature,
+        subtalker_top_k=top_k,
+        subtalker_top_p=top_p,
+    ))
+
+
+@functools.lru_cache(maxsize=64)
+def _load_voice_clone_prompt(prompt_path: str, model_name: str, mtime_ns: int) -> list:
+    """
+    Load a saved voice's clone prompt, prepared for the model's dtype/device.
+
+    Cached per (prompt file, model_name); `mtime_ns` is part of the key so
+    re-saving a voice invalidates its entry.
+    """
+    from audio.generator import _get_model_dtype_device, _prepare_voice_clone_prompt
+    from audio.model_loader import get_model
+    from storage.voice import load_prompt_safetensors
+
+    model = get_model(model_name)
+    path = Path(prompt_path)
+    if path.suffix == ".safetensors":
+        # Tensors land directly on the model device; prepare only fixes dtype
+        _, device = _get_model_dtype_device(model)
+        raw_prompt = load_prompt_safetensors(path.parent, device=device)
+    else:
+        with open(path, "rb") as f:
+            raw_prompt = pickle.load(f)
+
+    # Prepare the voice clone prompt (normalize dtype/device to match model)
+    return _prepare_voice_clone_prompt(raw_prompt, model)
+
+
+def get_voice_clone_prompt(voice_id: str, model_name: str) -> list:
+    """
+    Return the prepared clone prompt for a saved voice, from cache when fresh.
+
+    Prefers prompt.safetensors (see convert_voice_pickles.py) and falls back
+    to the legacy prompt.pkl when that is missing or older.
+    """
+    voice_dir = SAVED_VOICES_DIR / voice_id
+    candidates = []
+    for name in ("prompt.safetensors", "prompt.pkl"):
+        try:
+            candidates.append((voice_dir / name, (voice_dir / name).stat().st_mtime_ns))
+        except FileNotFoundError:
+            continue
+    if not candidates:
+        logger.error(f"Voice prompt file not found for '{voice_id}'")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Voice prompt file not found for '{voice_id}'"
+        )
+    # Newest wins, so a pickle re-saved from the UI supersedes a stale conversion
+    prompt_path, mtime_ns = max(candidates, key=lambda c: c[1])
+    return _load_voice_clone_prompt(str(prompt_path), model_name, mtime_ns)
+
+
+def _generate(model, jobs: list[TTSJob], prompts: Optional[list] = None) -> tuple[list, int]:
+    """
+    Run one generate call for jobs that share a batch key.
+
+    Qwen3-TTS accepts lists for text/speaker/language/instruct, so all jobs in
+    the group are stacked into a single call. `prompts` holds the voice clone
+    prompt items for saved voices, in job order.
+
+    Returns:
+        Tuple of (per-job waveforms, sample rate)
+    """
+    first = jobs[0]
+    texts = [job.request.text for job in jobs]
+    languages = [job.language for job in jobs]
+    instructs = [job.request.instruct for job in jobs]
+    sampling = _gen_kwargs(*first.gen_params)
+
+    logger.info(f"Generating batch of {len(jobs)} ({first.voice_type}) - Language: {first.language}, Tokens: {sampling['max_new_tokens']}")
+    if prompts is None:
+        return model.generate_custom_voice(
+            text=texts,
+            speaker=[job.request.voice_id for job in jobs],
+            language=languages,
+            instruct=instructs,
+            **sampling,
+        )
+    return model.generate_voice_clone(
+        text=texts,
+        language=languages,
+        voice_clone_prompt=prompts,
+        instruct=instructs,
+        **sampling,
+    )
+
+
+def generate_batch(jobs: list[TTSJob]) -> list:
+    """
+    Generate audio for a group of jobs that share a batch key.
+
+    Failures are kept per job: a saved voice whose prompt can't be loaded only
+    fails its own request, and if the fused call raises (e.g. out of memory
+    on a large batch) the jobs are retried one at a time so each gets its own
+    result or error.
+
+    Returns:
+        One entry per job: a (waveform, sample_rate) tuple or the Exception
+        that job failed with
+
+    Raises:
+        HTTPException: If the shared model fails to load
+    """
+    from audio.model_loader import get_model
+
+    model_name = jobs[0].model_name
+    logger.info(f"Loading model '{model_name}'...")
+    try:
+        model = get_model(model_name)
+        logger.info(f"Model '{model_name}' loaded successfully")
+    except Exception as e:
+        logger.error(f"Failed to load model '{model_name}': {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to load model '{model_name}': {str(e)}"
+        )
+
+    results: list = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    job_prompts: dict[int, list] = {}
+    if jobs[0].voice_type == "saved":
+        pending = []
+        for i, job in enumerate(jobs):
+            logger.info(f"Loading voice clone data for '{job.request.voice_id}'...")
+            try:
+                job_prompts[i] = get_voice_clone_prompt(job.request.voice_id, model_name)
+            except Exception as e:
+                results[i] = e
+                continue
+            pending.append(i)
+    if not pending:
+        return results
+
+    def run(indices: list[int]) -> tuple[list, int]:
+        prompts = None
+        if job_prompts:
+            prompts = [item for i in indices for item in job_prompts[i]]
+        return _generate(model, [jobs[i] for i in indices], prompts)
+
+    try:
+        wavs, sr = run(pending)
+        for i, wav in zip(pending, wavs):
+            results[i] = (wav, sr)
+    except Exception as e:
+        if len(pending) == 1:
+            results[pending[0]] = e
+            return results
+        logger.warning(f"Batch of {len(pending)} failed ({str(e)}), retrying one at a time")
+        for i in pending:
+            try:
+                wavs, sr = run([i])
+                results[i] = (wavs[0], sr)
+            except Exception as job_error:
+                results[i] = job_error
+    return results
+
+
+async def _run_batch(jobs: list[TTSJob]) -> None:
+    """Generate a fused batch off the event loop and resolve each job's future."""
+    gen_start = time.time()
+    try:
+        # Buckets accumulate independently but share one model
+        async with app.state.model_lock:
+            results = await asyncio.to_thread(generate_batch, jobs)
+    except Exception as e:
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_exception(e)
+        return
+
+    logger.info(f"Batch of {len(jobs)} generated in {time.time() - gen_start:.2f}s")
+    for job, result in zip(jobs, results):
+        if job.future.done():
+            continue
+        if isinstance(result, Exception):
+            job.future.set_exception(result)
+        else:
+            job.future.set_result(result)
+
+
+async def server_loop(app: FastAPI, bucket: int) -> None:
+    """
+    Background worker for one length bucket.
+
+    Waits for a request, keeps draining the bucket's queue for up to
+    BATCH_MAX_WAIT_MS (or until BATCH_MAX_SIZE jobs are collected), groups
+    compatible jobs and runs one generate call per group.
+    """
+    queue: asyncio.Queue = app.state.model_queues[bucket]
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + BATCH_MAX_WAIT_MS / 1000
+        while len(batch) < BATCH_MAX_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        groups: dict[tuple, list[TTSJob]] = {}
+        for job in batch:
+            groups.setdefault(job.batch_key, []).append(job)
+        for jobs in groups.values():
+            await _run_batch(jobs)
+
+
+def _check_single_worker():
+    """
+    Refuse to run several server workers against the same GPU(s).
+
+    Each worker process loads its own model copy, and the copies fight over
+    device memory and compute; concurrency comes from the in-process batch
+    queue instead. Takes an exclusive, non-blocking lock on a file named
+    after CUDA_VISIBLE_DEVICES, so a second worker on the same devices
+    (uvicorn --workers, gunicorn -w, or a second server) fails at startup.
+    The OS drops the lock when the process exits. Set
+    QWEN_TTS_ALLOW_MULTI_WORKER=1 to skip the check.
+
+    Returns:
+        The open lock file (keep a reference for the process lifetime), or None
+    """
+    if os.environ.get("QWEN_TTS_ALLOW_MULTI_WORKER") == "1":
+        return None
+    devices = os.environ.get("CUDA_VISIBLE_DEVICES", "all").replace(",", "_") or "none"
+    lock_path = Path(tempfile.gettempdir()) / f"qwen_tts_gpu_{devices}.lock"
+    lock_file = open(lock_path, "a+")
+    try:
+        lock_file.seek(0)
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(
+            f"Another Qwen3-TTS server worker already holds {lock_path}: run one "
+            "worker per GPU. For multiple GPUs, start one server per GPU with "
+            "CUDA_VISIBLE_DEVICES set, or set QWEN_TTS_ALLOW_MULTI_WORKER=1 to override."
+        )
+    return lock_file
+
+
+@app.on_event("startup")
+async def start_worker():
+    """Create the per-bucket request queues and start their batch workers."""
+    app.state.gpu_lock = _check_single_worker()
+    app.state.model_lock = asyncio.Lock()
+    app.state.model_queues = {bucket: asyncio.Queue() for bucket in range(len(LENGTH_BUCKETS))}
+    app.state.worker_tasks = [
+        asyncio.create_task(server_loop(app, bucket)) for bucket in app.state.model_queues
+    ]
+    app.state.ffmpeg_pool = FFmpegPool()
+    for fmt in FFMPEG_CODECS:
+        app.state.ffmpeg_pool.prewarm(FFMPEG_PREWARM_SAMPLE_RATE, fmt)
+    # Import qwen_tts in the background so the first request doesn't pay for it
+    from audio.model_loader import _lazy_qwen
+
+    app.state.preload_task = asyncio.create_task(asyncio.to_thread(_lazy_qwen))
+
+
+@app.on_event("shutdown")
+async def stop_encoders():
+    """Kill idle pre-spawned ffmpeg encoders."""
+    await app.state.ffmpeg_pool.close()
+
+
+# Voice list and voice_id -> voice info, rebuilt when saved_voices/ changes
+_voices_cache: dict[str, Any] = {"mtime": None, "list": [], "map": {}}
+# voice_id -> ((mtime_ns, size) of its metadata.json, voice info)
+_saved_voice_cache: dict[str, tuple[tuple[int, int], dict]] = {}
+
+
+def _store_voices(voices: list[dict]) -> None:
+    """Cache a fresh voice list; on a voice_id clash the first entry (preset) wins."""
+    voices_map: dict[str, dict] = {}
+    for v in voices:
+        voices_map.setdefault(v["voice_id"], v)
+    _voices_cache["list"] = voices
+    _voices_cache["map"] = voices_map
+
+
+def _get_voices_map() -> dict[str, dict]:
+    """
+    Return available voices keyed by voice_id.
+
+    The map is rebuilt from get_available_voices() only when the mtime of
+    SAVED_VOICES_DIR changes (a voice was added, removed or renamed); preset
+    voices are hardcoded and never change at runtime. Saved voices are
+    re-checked individually by _current_saved_voice().
+    """
+    try:
+        mtime = SAVED_VOICES_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime = 0
+    if _voices_cache["mtime"] != mtime:
+        from storage.voice import get_available_voices
+        _store_voices(get_available_voices())
+        _voices_cache["mtime"] = mtime
+    return _voices_cache["map"]
+
+
+def _current_saved_voice(voice_id: str) -> Optional[dict]:
+    """
+    Return a saved voice's info from its metadata.json, or None if it has none.
+
+    Only this voice's metadata.json is stat'ed, and re-read when it changed.
+    That catches what the directory mtime misses: metadata.json written after
+    the voice directory was created (the UI copies the prompt and audio
+    first), and a voice re-saved in place, possibly for another model.
+    """
+    if voice_id in ("", ".", "..") or Path(voice_id).name != voice_id:
+        return None
+    meta_path = SAVED_VOICES_DIR / voice_id / "metadata.json"
+    try:
+        st = meta_path.stat()
+    except OSError:
+        _saved_voice_cache.pop(voice_id, None)
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _saved_voice_cache.get(voice_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    from storage.voice import saved_voice_entry
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        # Missing or still being written
+        return None
+    info = saved_voice_entry(voice_id, meta)
+    _saved_voice_cache[voice_id] = (key, info)
+    return info
+
+
+def _lookup_voice(voice_id: str) -> Optional[dict]:
+    """Find a voice; presets shadow saved voices of the same name."""
+    info = _get_voices_map().get(voice_id)
+    if info is not None and info.get("type") == "preset":
+        return info
+    return _current_saved_voice(voice_id)
+
+
+async def _resolve_voice(voice_id: str) -> tuple[str, str]:
+    """
+    Look up a voice and pick the model that serves it.
+
+    Returns:
+        Tuple of (voice_type, model_name)
+
+    Raises:
+        HTTPException: If the voice does not exist or has an unknown type
+    """
+    # Validate voice exists
+    logger.info(f"Validating voice '{voice_id}'...")
+    # Stat/rebuild touches the filesystem, so keep it off the event loop
+    voice_info = await asyncio.to_thread(_lookup_voice, voice_id)
+    
+    if voice_info is None:
+        logger.warning(f"Voice '{voice_id}' not found")
+        raise HTTPException(
+            status_code=404,
+            detail=f"Voice '{voice_id}' not found. Use GET /voices to see available voices."
+        )
+    
+    voice_type = voice_info.get("type", "preset")
+    logger.info(f"Voice validated - Type: {voice_type}")
+    
+    if voice_type not in ("preset", "saved"):
+        logger.error(f"Invalid voice type: {voice_type}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid voice type: {voice_type}"
+        )
+    
+    # Saved voices carry the model they were created with, read from the
+    # current metadata.json so a re-saved voice switches model with its prompt
+    model_name = voice_info.get("model", "1.7B-CustomVoice")
+    return voice_type, model_name
+
+
+async def _submit_job(
+    request: TTSRequest, voice_type: str, model_name: str, language: str
+) -> asyncio.Future:
+    """Queue a request for the batch worker; the future resolves to (wav, sr)."""
+    future = asyncio.get_running_loop().create_future()
+    await app.state.model_queues[bucket_for(len(request.text))].put(TTSJob(
+        request=request,
+        voice_type=voice_type,
+        model_name=model_name,
+        language=language,
+        future=future,
+    ))
+    return future
+
+
+async def _generate_chunks(
+    request: TTSRequest, voice_type: str, model_name: str, language: str
+) -> AsyncGenerator[tuple[np.ndarray, int], None]:
+    """
+    Generate a request sentence-chunk by sentence-chunk.
+
+    The next chunk is queued before the current one is yielded so generation
+    overlaps with sending audio. The last STREAM_CROSSFADE_MS of each chunk is
+    held back and crossfaded into the start of the next one.
+    """
+    from audio.generator import _crossfade_audio, _split_text_into_chunks
+
+    texts = _split_text_into_chunks(request.text)
+    logger.info(f"Streaming {len(texts)} chunk(s) for voice '{request.voice_id}'")
+
+    def submit(text: str):
+        return _submit_job(request.model_copy(update={"text": text}), voice_type, model_name, language)
+
+    pending = await submit(texts[0])
+    tail = None
+    try:
+        for i in range(len(texts)):
+            wav, sr = await pending
+            is_last = i + 1 == len(texts)
+            if not is_last:
+                pending = await submit(texts[i + 1])
+
+            pcm = np.asarray(wav, dtype=np.float32)
+            if tail is not None:
+                pcm = _crossfade_audio(tail, pcm, sr, STREAM_CROSSFADE_MS).astype(np.float32)
+            fade_samples = int(sr * STREAM_CROSSFADE_MS / 1000)
+            if not is_last and len(pcm) > fade_samples:
+                pcm, tail = pcm[:-fade_samples], pcm[-fade_samples:]
+            else:
+                tail = None
+            yield pcm, sr
+    finally:
+        if not pending.done():
+            pending.cancel()
+
+
+def _wav_stream_header(sr: int) -> bytes:
+    """RIFF header for 16-bit mono PCM of unknown length (sizes set to max)."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, 1, sr, sr * 2, 2, 16,
+        b"data", 0xFFFFFFFF,
+    )
+
+
+def _to_pcm16(pcm: np.ndarray) -> bytes:
+    """Convert float samples in [-1, 1] to little-endian 16-bit PCM bytes."""
+    return (np.clip(pcm, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -91,6 +782,7 @@ async def root():
         "endpoints": {
             "/voices": "GET - List all available voices",
             "/tts": "POST - Generate speech from text",
+            "/tts/stream": "POST - Stream speech as it is generated",
             "/health": "GET - Health check"
         }
     }
@@ -113,7 +805,9 @@ async def list_voices():
     logger.info("Retrieving available voices...")
     try:
         from storage.voice import get_available_voices
-        voices = get_available_voices()
+        # Always a fresh scan (not the hot path); refreshes the lookup cache too
+        voices = await asyncio.to_thread(get_available_voices)
+        _store_voices(voices)
         logger.info(f"Found {len(voices)} available voices")
         return {
             "success": True,
@@ -143,180 +837,47 @@ async def generate_speech(request: TTSRequest):
     logger.info(f"TTS request received - Voice: {request.voice_id}, Language: {request.language}, Format: {request.format}, Text length: {len(request.text)} chars")
     
     try:
-        from storage.voice import get_available_voices
-        from audio.model_loader import get_model
-        
-        # Validate voice exists
-        logger.info(f"Validating voice '{request.voice_id}'...")
-        available_voices = get_available_voices()
-        voice_info = None
-        voice_type = None
-        
-        for voice in available_voices:
-            if voice["voice_id"] == request.voice_id:
-                voice_info = voice
-                voice_type = voice.get("type", "preset")
-                break
-        
-        if voice_info is None:
-            logger.warning(f"Voice '{request.voice_id}' not found")
-            raise HTTPException(
-                status_code=404,
-                detail=f"Voice '{request.voice_id}' not found. Use GET /voices to see available voices."
-            )
-        
-        logger.info(f"Voice validated - Type: {voice_type}")
-        
-        # Determine model to use
-        model_name = "1.7B-CustomVoice"
-        
-        if voice_type == "saved":
-            # Load metadata to check which model was used
-            voice_meta_path = SAVED_VOICES_DIR / request.voice_id / "metadata.json"
-            if voice_meta_path.exists():
-                with open(voice_meta_path) as f:
-                    voice_meta = json.load(f)
-                    model_name = voice_meta.get("model", "1.7B-Base")
-            else:
-                model_name = "1.7B-Base"
-        
-        # Load model
-        logger.info(f"Loading model '{model_name}'...")
-        try:
-            model = get_model(model_name)
-            logger.info(f"Model '{model_name}' loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load model '{model_name}': {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to load model '{model_name}': {str(e)}"
-            )
+        voice_type, model_name = await _resolve_voice(request.voice_id)
         
         # Normalize language (convert 'en' to 'english', etc.)
         language = LANGUAGE_MAP.get(request.language, request.language)
-        logger.info(f"Starting audio generation - Language: {language}, Tokens: {request.max_new_tokens}")
         
-        # Generate audio
+        # Hand off to the batch worker and wait for this request's waveform
         gen_start = time.time()
-        if voice_type == "preset":
-            logger.info(f"Generating audio with preset voice '{request.voice_id}'...")
-            wavs, sr = model.generate_custom_voice(
-                text=request.text,
-                speaker=request.voice_id,
-                language=language,
-                instruct=request.instruct,
-                temperature=request.temperature,
-                top_k=request.top_k,
-                top_p=request.top_p,
-                repetition_penalty=request.repetition_penalty,
-                max_new_tokens=request.max_new_tokens,
-                subtalker_temperature=request.temperature,
-                subtalker_top_k=request.top_k,
-                subtalker_top_p=request.top_p,
-            )
-        elif voice_type == "saved":
-            # Load voice clone prompt
-            logger.info(f"Loading voice clone data for '{request.voice_id}'...")
-            prompt_path = SAVED_VOICES_DIR / request.voice_id / "prompt.pkl"
-            if not prompt_path.exists():
-                logger.error(f"Voice prompt file not found for '{request.voice_id}'")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Voice prompt file not found for '{request.voice_id}'"
-                )
-            
-            with open(prompt_path, "rb") as f:
-                raw_prompt = pickle.load(f)
-            
-            # Prepare the voice clone prompt (normalize dtype/device to match model)
-            from audio.generator import _prepare_voice_clone_prompt
-            voice_clone_prompt = _prepare_voice_clone_prompt(raw_prompt, model)
-            logger.info(f"Generating audio with cloned voice '{request.voice_id}'...")
-            
-            wavs, sr = model.generate_voice_clone(
-                text=request.text,
-                language=language,
-                voice_clone_prompt=voice_clone_prompt,
-                instruct=request.instruct,
-                temperature=request.temperature,
-                top_k=request.top_k,
-                top_p=request.top_p,
-                repetition_penalty=request.repetition_penalty,
-                max_new_tokens=request.max_new_tokens,
-                subtalker_temperature=request.temperature,
-                subtalker_top_k=request.top_k,
-                subtalker_top_p=request.top_p,
-            )
-        else:
-            logger.error(f"Invalid voice type: {voice_type}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid voice type: {voice_type}"
-            )
+        future = await _submit_job(request, voice_type, model_name, language)
+        logger.info(f"Queued for generation - Model: {model_name}, Language: {language}, Tokens: {request.max_new_tokens}")
+        wav, sr = await future
         
         gen_time = time.time() - gen_start
-        logger.info(f"Audio generation completed in {gen_time:.2f}s - Sample rate: {sr}Hz, Duration: {len(wavs[0])/sr:.2f}s")
+        logger.info(f"Audio generation completed in {gen_time:.2f}s - Sample rate: {sr}Hz, Duration: {len(wav)/sr:.2f}s")
         
-        # Save to temporary WAV file first
-        logger.info("Saving audio to temporary file...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            wav_path = tmp_file.name
-            sf.write(wav_path, wavs[0], sr)
-        
-        # Convert to requested format if not WAV
-        if request.format != "wav":
+        if request.format == "wav":
+            # Encode WAV in memory - no temp file round-trip
+            audio_bytes = await asyncio.to_thread(_encode_wav, wav, sr)
+            logger.info("Using WAV format (no conversion needed)")
+        else:
             logger.info(f"Converting audio to {request.format.upper()} format...")
             convert_start = time.time()
             try:
-                audio = AudioSegment.from_wav(wav_path)
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f".{request.format}") as tmp_file:
-                    output_path = tmp_file.name
-                
-                # Export with format-specific parameters
-                if request.format == "m4a":
-                    audio.export(output_path, format="mp4", codec="aac", bitrate="192k")
-                elif request.format == "mp3":
-                    audio.export(output_path, format="mp3", bitrate="192k")
-                elif request.format == "ogg":
-                    audio.export(output_path, format="ogg", codec="libvorbis")
-                elif request.format == "flac":
-                    audio.export(output_path, format="flac")
-                
-                # Clean up WAV file
-                os.unlink(wav_path)
+                audio_bytes = await encode_audio(wav, sr, request.format)
                 convert_time = time.time() - convert_start
                 logger.info(f"Format conversion completed in {convert_time:.2f}s")
             except Exception as e:
-                # Clean up WAV file on error
-                if os.path.exists(wav_path):
-                    os.unlink(wav_path)
                 logger.error(f"Failed to convert audio to {request.format}: {str(e)}")
                 raise HTTPException(
                     status_code=500,
                     detail=f"Failed to convert audio to {request.format}: {str(e)}. Make sure ffmpeg is installed."
                 )
-        else:
-            output_path = wav_path
-            logger.info("Using WAV format (no conversion needed)")
-        
-        # Determine media type
-        media_types = {
-            "wav": "audio/wav",
-            "m4a": "audio/mp4",
-            "mp3": "audio/mpeg",
-            "ogg": "audio/ogg",
-            "flac": "audio/flac"
-        }
         
         total_time = time.time() - start_time
-        logger.info(f"TTS request completed successfully in {total_time:.2f}s - Format: {request.format}, Size: {os.path.getsize(output_path)/1024:.1f}KB")
+        logger.info(f"TTS request completed successfully in {total_time:.2f}s - Format: {request.format}, Size: {len(audio_bytes)/1024:.1f}KB")
         
-        # Return audio file
-        return FileResponse(
-            output_path,
-            media_type=media_types.get(request.format, "audio/wav"),
-            filename=f"{request.voice_id}_output.{request.format}",
+        # Return audio bytes
+        return Response(
+            audio_bytes,
+            media_type=MEDIA_TYPES.get(request.format, "audio/wav"),
             headers={
+                "Content-Disposition": f'attachment; filename="{request.voice_id}_output.{request.format}"',
                 "X-Voice-ID": request.voice_id,
                 "X-Voice-Type": voice_type,
                 "X-Sample-Rate": str(sr),
@@ -334,8 +895,136 @@ async def generate_speech(request: TTSRequest):
         )
 
 
+@app.post("/tts/stream")
+async def stream_speech(request: TTSRequest):
+    """
+    Stream speech as each sentence chunk finishes generating.
+
+    WAV is streamed as 16-bit PCM behind a header with unknown length; other
+    formats go through one ffmpeg encoder kept open for the whole request.
+    The first chunk is generated and the encoder acquired before the
+    response starts, so voice, generation and ffmpeg errors still map to
+    HTTP status codes.
+
+    Args:
+        request: TTSRequest with text, voice_id, and optional parameters
+
+    Returns:
+        StreamingResponse with audio in the requested format
+
+    Raises:
+        HTTPException: If voice not found or generation fails
+    """
+    start_time = time.time()
+    logger.info(f"TTS stream request received - Voice: {request.voice_id}, Language: {request.language}, Format: {request.format}, Text length: {len(request.text)} chars")
+
+    try:
+        voice_type, model_name = await _resolve_voice(request.voice_id)
+        language = LANGUAGE_MAP.get(request.language, request.language)
+        chunks = _generate_chunks(request, voice_type, model_name, language)
+        first_pcm, sr = await chunks.__anext__()
+        logger.info(f"First chunk ready in {time.time() - start_time:.2f}s")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"TTS stream failed with unexpected error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"TTS generation failed: {str(e)}"
+        )
+
+    proc = None
+    if request.format != "wav":
+        try:
+            proc = await app.state.ffmpeg_pool.acquire(sr, request.format)
+        except Exception as e:
+            await chunks.aclose()
+            logger.error(f"Failed to start {request.format} encoder: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to convert audio to {request.format}: {str(e)}. Make sure ffmpeg is installed."
+            )
+
+    async def wav_stream():
+        yield _wav_stream_header(sr)
+        yield _to_pcm16(first_pcm)
+        async for pcm, _ in chunks:
+            yield _to_pcm16(pcm)
+
+    async def encoded_stream(proc: subprocess.Popen):
+        stdin, stderr = proc.stdin, proc.stderr
+        assert stdin is not None and stderr is not None
+
+        def write(data: bytes) -> None:
+            stdin.write(data)
+            stdin.flush()
+
+        async def feed():
+            try:
+                await asyncio.to_thread(write, first_pcm.tobytes())
+                async for pcm, _ in chunks:
+                    await asyncio.to_thread(write, pcm.tobytes())
+            finally:
+                await asyncio.to_thread(stdin.close)
+
+        output: asyncio.Queue = asyncio.Queue()
+        threading.Thread(
+            target=_pump_encoder_output,
+            args=(proc, asyncio.get_running_loop(), output),
+            name="ffmpeg-stream-reader",
+            daemon=True,
+        ).start()
+        writer = asyncio.create_task(feed())
+        try:
+            while (data := await output.get()) is not None:
+                yield data
+            await writer
+            # EOF alone doesn't mean success; a failed encode must not end
+            # the response as if it were complete
+            if await asyncio.to_thread(proc.wait) != 0:
+                err = await asyncio.to_thread(stderr.read)
+                raise RuntimeError(
+                    err.decode(errors="replace").strip()
+                    or f"ffmpeg exited with {proc.returncode}"
+                )
+        finally:
+            # Kill first: that unblocks the reader thread and any write stuck on
+            # a full pipe, which the writer task would otherwise wait on
+            await asyncio.to_thread(_kill_encoder, proc)
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+
+    async def logged(stream):
+        try:
+            async for data in stream:
+                yield data
+            logger.info(f"TTS stream completed in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            logger.error(f"TTS stream aborted: {str(e)}")
+            raise
+        finally:
+            # Close the encoder side first so nothing is still iterating chunks
+            await stream.aclose()
+            await chunks.aclose()
+
+    return StreamingResponse(
+        logged(wav_stream() if proc is None else encoded_stream(proc)),
+        media_type=MEDIA_TYPES.get(request.format, "audio/wav"),
+        headers={
+            "X-Voice-ID": request.voice_id,
+            "X-Voice-Type": voice_type,
+            "X-Sample-Rate": str(sr),
+            "X-Audio-Format": request.format
+        }
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
+    # A single process owns the model and multiplexes concurrent requests
+    # through the batch queue (enforced at startup by _check_single_worker).
+    # For multiple GPUs run one server per GPU, e.g.
+    # CUDA_VISIBLE_DEVICES=1 uvicorn api_server:app --port 8002
     logger.info("Starting Qwen3-TTS API server on http://0.0.0.0:8001")
     logger.info("Visit http://localhost:8001/docs for interactive API documentation")
     uvicorn.run(app, host="0.0.0.0", port=8001)
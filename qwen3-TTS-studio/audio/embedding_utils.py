@@ -1,5 +1,7 @@
 """Utilities for combining multiple speaker embeddings for improved voice cloning."""
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import torch
 import torch.nn.functional as F
@@ -23,6 +25,13 @@ class AudioSampleInfo:
 
 def get_audio_duration(audio_path: str) -> float:
     """Get duration of audio file in seconds."""
+    try:
+        # Header-only read; no need to decode the samples
+        info = sf.info(audio_path)
+        if info.samplerate > 0 and info.frames > 0:
+            return info.frames / info.samplerate
+    except Exception:
+        pass
     try:
         data, sr = sf.read(audio_path)
         return len(data) / sr
@@ -34,6 +43,20 @@ def estimate_snr(audio_path: str) -> float:
     """
     Estimate Signal-to-Noise Ratio of an audio file.
 
+    Returns:
+        Estimated SNR in dB (higher is better), or 0.0 on error
+    """
+    try:
+        data, sr = sf.read(audio_path, dtype="float32")
+    except Exception:
+        return 20.0
+    return estimate_snr_from_array(data, sr)
+
+
+def estimate_snr_from_array(data: np.ndarray, sr: int) -> float:
+    """
+    Estimate Signal-to-Noise Ratio of already-decoded audio.
+
     Uses a simple heuristic based on:
     - RMS energy of the full signal vs silent portions
     - Assumes first/last 5% might contain silence
@@ -42,11 +65,10 @@ def estimate_snr(audio_path: str) -> float:
         Estimated SNR in dB (higher is better), or 0.0 on error
     """
     try:
-        data, sr = sf.read(audio_path)
         if len(data) == 0 or sr <= 0:
             return 0.0
 
-        audio = data.astype(np.float32)
+        audio = data.astype(np.float32, copy=False)
         if audio.ndim > 1:
             audio = np.mean(audio, axis=1)
 
@@ -59,13 +81,11 @@ def estimate_snr(audio_path: str) -> float:
         if n_frames < 10:
             return 20.0
 
-        frame_rms = []
-        for i in range(n_frames):
-            frame = audio[i * frame_size : (i + 1) * frame_size]
-            frame_rms.append(np.sqrt(np.mean(frame**2)))
-
-        frame_rms = np.array(frame_rms)
-        noise_floor = np.percentile(frame_rms, 10)
+        frames = audio[: n_frames * frame_size].reshape(n_frames, frame_size)
+        frame_rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame_size)
+        # 10th-percentile frame energy via O(n) selection instead of a full sort
+        k = n_frames // 10
+        noise_floor = np.partition(frame_rms, k)[k]
 
         if noise_floor < 1e-10:
             return 40.0
@@ -77,6 +97,16 @@ def estimate_snr(audio_path: str) -> float:
         return 20.0
 
 
+def _analyze_one(path: str) -> tuple[float, float]:
+    """Decode a file once and return its (duration, snr_estimate)."""
+    try:
+        data, sr = sf.read(path, dtype="float32", always_2d=False)
+    except Exception:
+        return 0.0, 20.0
+    duration = len(data) / sr if sr > 0 else 0.0
+    return duration, estimate_snr_from_array(data, sr)
+
+
 def analyze_audio_samples(
     audio_paths: list[str],
     transcripts: Optional[list[Optional[str]]] = None,
@@ -97,11 +127,16 @@ def analyze_audio_samples(
     if len(transcript_list) < len(audio_paths):
         transcript_list.extend([None] * (len(audio_paths) - len(transcript_list)))
 
-    samples = []
-    for i, (path, transcript) in enumerate(zip(audio_paths, transcript_list)):
-        duration = get_audio_duration(path)
-        snr = estimate_snr(path)
+    # Decode files in parallel; libsndfile releases the GIL while reading
+    metrics: list[tuple[float, float]] = []
+    if audio_paths:
+        with ThreadPoolExecutor(max_workers=min(8, len(audio_paths))) as pool:
+            metrics = list(pool.map(_analyze_one, audio_paths))
 
+    samples = []
+    for i, (path, transcript, (duration, snr)) in enumerate(
+        zip(audio_paths, transcript_list, metrics)
+    ):
         samples.append(
             AudioSampleInfo(
                 path=path,
@@ -112,41 +147,39 @@ def analyze_audio_samples(
             )
         )
 
-    # Compute weights based on duration and quality
-    total_duration = sum(s.duration for s in samples)
-    if total_duration > 0:
-        for s in samples:
-            # Duration weight (normalized)
-            duration_weight = s.duration / total_duration
+    if not samples:
+        return samples
 
-            # Quality weight (SNR normalized to 0-1 range, assuming 0-40dB)
-            snr = s.snr_estimate or 20.0
-            quality_weight = min(1.0, snr / 40.0)
+    # Per-sample metrics as arrays, gathered once
+    durations = np.fromiter((s.duration for s in samples), dtype=np.float64)
+    snrs = np.fromiter((s.snr_estimate or 20.0 for s in samples), dtype=np.float64)
+    has_transcript = np.fromiter(
+        (bool(s.transcript and s.transcript.strip()) for s in samples), dtype=bool
+    )
 
-            # Combined weight: 70% duration, 30% quality
-            s.weight = 0.7 * duration_weight + 0.3 * quality_weight
+    # Compute weights based on duration and quality:
+    # 70% normalized duration, 30% SNR mapped to 0-1 (assuming 0-40dB)
+    total_duration = durations.sum()
+    if total_duration > 0:
+        weights = 0.7 * (durations / total_duration) + 0.3 * np.minimum(1.0, snrs / 40.0)
+    else:
+        weights = np.ones(len(samples))
 
     # Normalize weights to sum to 1
-    total_weight = sum(s.weight for s in samples)
+    total_weight = weights.sum()
     if total_weight > 0:
-        for s in samples:
-            s.weight = s.weight / total_weight
+        weights = weights / total_weight
 
     # Select best sample as primary
     # Prefer samples with transcripts (needed for ICL mode), fall back to best quality
-    if samples:
-        samples_with_transcript = [
-            i for i, s in enumerate(samples) if s.transcript and s.transcript.strip()
-        ]
-        candidates = (
-            samples_with_transcript if samples_with_transcript else range(len(samples))
-        )
-        best_idx = max(
-            candidates,
-            key=lambda i: samples[i].duration * (samples[i].snr_estimate or 20.0),
-        )
-        for i, s in enumerate(samples):
-            s.is_primary = i == best_idx
+    candidates = (
+        np.flatnonzero(has_transcript) if has_transcript.any() else np.arange(len(samples))
+    )
+    best_idx = int(candidates[np.argmax(durations[candidates] * snrs[candidates])])
+
+    for i, (s, weight) in enumerate(zip(samples, weights.tolist())):
+        s.weight = weight
+        s.is_primary = i == best_idx
 
     return samples
 
@@ -185,50 +218,43 @@ def combine_speaker_embeddings(
     if device is None:
         device = embeddings[0].device
 
-    # Move all embeddings to same device and normalize
-    normed = []
-    for e in embeddings:
-        e_device = e.to(device).float()
-        normed.append(F.normalize(e_device, dim=-1))
+    # Move all embeddings to same device and normalize as one (N, D) tensor
+    stacked = F.normalize(
+        torch.stack([e.to(device).float() for e in embeddings]), dim=-1
+    )
 
     # Default to equal weights
     if weights is None:
-        weights = [1.0] * len(normed)
+        weights = [1.0] * len(embeddings)
+    w = torch.tensor(weights, device=stacked.device, dtype=stacked.dtype)
 
     # Compute centroid for outlier detection
-    stacked = torch.stack(normed)
     centroid = stacked.mean(dim=0)
     centroid = F.normalize(centroid, dim=-1)
 
     # Filter outliers based on cosine similarity to centroid
-    valid_embeddings = []
-    valid_weights = []
-
-    for i, (emb, w) in enumerate(zip(normed, weights)):
-        if outlier_threshold > 0:
-            sim = (emb.flatten() * centroid.flatten()).sum().item()
+    if outlier_threshold > 0:
+        # One device->host copy for all similarities instead of one per sample
+        sims = (stacked.flatten(1) @ centroid.flatten()).cpu().tolist()
+        keep = []
+        for i, sim in enumerate(sims):
             if sim < outlier_threshold:
                 print(
                     f"[Embedding] Sample {i} excluded: cosine similarity {sim:.3f} < {outlier_threshold}"
                 )
                 continue
-        valid_embeddings.append(emb)
-        valid_weights.append(w)
-
-    # If all samples were filtered, fall back to using all
-    if not valid_embeddings:
-        print("[Embedding] Warning: All samples below threshold, using all")
-        valid_embeddings = normed
-        valid_weights = weights
-
-    # Normalize weights
-    total_w = sum(valid_weights)
-    valid_weights = [w / total_w for w in valid_weights]
-
-    # Compute weighted mean
-    combined = torch.zeros_like(valid_embeddings[0])
-    for emb, w in zip(valid_embeddings, valid_weights):
-        combined = combined + w * emb
+            keep.append(i)
+        if not keep:
+            # If all samples were filtered, fall back to using all
+            print("[Embedding] Warning: All samples below threshold, using all")
+        elif len(keep) < len(sims):
+            idx = torch.tensor(keep, device=stacked.device)
+            stacked = stacked[idx]
+            w = w[idx]
+
+    # Weighted mean as a single matrix-vector product
+    combined = (w / w.sum()) @ stacked.flatten(1)
+    combined = combined.reshape(stacked.shape[1:])
 
     # Final L2 normalization
     combined = F.normalize(combined, dim=-1)
@@ -236,6 +262,40 @@ def combine_speaker_embeddings(
     return combined
 
 
+def _create_voice_clone_prompts_batch(
+    model: Any,
+    sample_infos: list[AudioSampleInfo],
+    x_vector_only_mode: bool,
+) -> list[Any]:
+    """
+    Create one voice clone prompt item per sample with a single model call.
+
+    create_voice_clone_prompt accepts lists of reference audios/texts and
+    returns one item per entry; falls back to per-sample calls if the batched
+    call fails.
+    """
+    if len(sample_infos) > 1:
+        try:
+            prompts = model.create_voice_clone_prompt(
+                ref_audio=[info.path for info in sample_infos],
+                ref_text=[info.transcript for info in sample_infos],
+                x_vector_only_mode=[x_vector_only_mode] * len(sample_infos),
+            )
+            if len(prompts) == len(sample_infos):
+                return list(prompts)
+        except Exception as e:
+            print(f"[Embedding] Batched prompt creation failed, using per-sample: {e}")
+
+    return [
+        model.create_voice_clone_prompt(
+            ref_audio=info.path,
+            ref_text=info.transcript,
+            x_vector_only_mode=x_vector_only_mode,
+        )[0]  # prompt is a list, take first item
+        for info in sample_infos
+    ]
+
+
 def create_combined_voice_clone_prompt(
     model: Any,
     sample_infos: list[AudioSampleInfo],
@@ -260,15 +320,9 @@ def create_combined_voice_clone_prompt(
     if not sample_infos:
         raise ValueError("At least one audio sample is required")
 
-    # Create individual prompts for each sample
-    all_prompts = []
-    for info in sample_infos:
-        prompt = model.create_voice_clone_prompt(
-            ref_audio=info.path,
-            ref_text=info.transcript,
-            x_vector_only_mode=x_vector_only_mode,
-        )
-        all_prompts.append((info, prompt[0]))  # prompt is a list, take first item
+    # Create prompts for all samples in one batched call
+    prompts = _create_voice_clone_prompts_batch(model, sample_infos, x_vector_only_mode)
+    all_prompts = list(zip(sample_infos, prompts))
 
     # Extract embeddings and weights
     embeddings = [p[1].ref_spk_embedding for p in all_prompts]
@@ -4,11 +4,19 @@ import os
 import shutil
 import gc
 import functools
+import logging
 from pathlib import Path
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import torch
 
+logger = logging.getLogger(__name__)
+
+# Standalone runs (no host app configuring logging) can opt in to output
+if os.environ.get("QWEN_TTS_LOG") == "1":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
 MODEL_PATHS = {
     "1.7B-CustomVoice": "./Qwen3-TTS-12Hz-1.7B-CustomVoice",
     "0.6B-CustomVoice": "./Qwen3-TTS-12Hz-0.6B-CustomVoice",
@@ -17,11 +25,15 @@ MODEL_PATHS = {
     "1.7B-VoiceDesign": "./Qwen3-TTS-12Hz-1.7B-VoiceDesign",
 }
 
-MAX_MODELS_IN_MEMORY = 1
+# Upper bound on resident models; below it, eviction is driven by free memory
+MAX_MODELS_IN_MEMORY = int(os.environ.get("QWEN_TTS_MAX_MODELS", "2"))
+# Fraction of device memory to keep free on top of the incoming model's weights
+MEMORY_FREE_THRESHOLD = float(os.environ.get("QWEN_TTS_MEMORY_FREE_THRESHOLD", "0.15"))
 
 
+@functools.lru_cache(maxsize=1)
 def _get_device():
-    """Auto-detect the best available device."""
+    """Auto-detect the best available device (probed once per process)."""
     if torch.cuda.is_available():
         return "cuda"
     elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
@@ -29,8 +41,113 @@ def _get_device():
     else:
         return "cpu"
 
+
+def _preferred_dtype(device: str) -> torch.dtype:
+    """Pick the load dtype from device capability."""
+    if device == "cuda":
+        # Native bf16 needs Ampere (SM 8.0)+; is_bf16_supported() also counts
+        # the slow emulated path on Volta/Turing, so check capability directly
+        return torch.bfloat16 if torch.cuda.get_device_capability() >= (8, 0) else torch.float16
+    elif device == "mps":
+        return torch.float16
+    else:
+        return torch.float32
+
+
+def _is_dtype_error(err: Exception) -> bool:
+    """Whether a load error is about an unsupported dtype."""
+    msg = str(err).lower()
+    return any(k in msg for k in ("bfloat16", "float16", "half", "dtype"))
+
+
 MIN_NEW_TOKENS_DEFAULT = int(os.environ.get("QWEN_TTS_MIN_NEW_TOKENS", "60"))
 
+# Nothing here trains; skip autograd bookkeeping. Grad mode is thread-local,
+# so this covers the importing thread and generate() is wrapped separately.
+INFERENCE_ONLY = os.environ.get("QWEN_TTS_INFERENCE_ONLY", "1") == "1"
+if INFERENCE_ONLY:
+    torch.set_grad_enabled(False)
+
+# Opt-in weight-only quantization on CUDA: "none", "int8", "int4" (bitsandbytes)
+# or "fp8" (torchao, SM >= 8.9)
+QUANTIZATION = os.environ.get("QWEN_TTS_QUANT", "none").lower()
+
+
+def _quantization_kwargs(device: str, dtype: torch.dtype) -> dict:
+    """from_pretrained kwargs for bitsandbytes int8/int4 weight quantization."""
+    if device != "cuda" or QUANTIZATION not in ("int8", "int4"):
+        return {}
+    try:
+        import bitsandbytes  # noqa: F401
+        from transformers import BitsAndBytesConfig
+    except ImportError:
+        logger.warning(f"QWEN_TTS_QUANT={QUANTIZATION} needs bitsandbytes; loading unquantized")
+        return {}
+    if QUANTIZATION == "int8":
+        config = BitsAndBytesConfig(load_in_8bit=True)
+    else:
+        config = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_compute_dtype=dtype,
+            bnb_4bit_quant_type="nf4",
+        )
+    return {"quantization_config": config}
+
+
+def _apply_fp8(model) -> bool:
+    """Swap linear weights to FP8 in place with torchao; returns True if applied."""
+    if torch.cuda.get_device_capability() < (8, 9):
+        logger.warning("QWEN_TTS_QUANT=fp8 needs an Ada/Hopper GPU (SM >= 8.9); skipping")
+        return False
+    try:
+        from torchao.quantization import float8_weight_only, quantize_
+    except ImportError:
+        logger.warning("QWEN_TTS_QUANT=fp8 needs torchao; skipping")
+        return False
+    try:
+        quantize_(model.model, float8_weight_only())
+    except Exception as e:
+        logger.warning(f"QWEN_TTS_QUANT=fp8 failed ({e}); keeping unquantized weights")
+        return False
+    return True
+
+
+# Opt-in: compile the decoder with CUDA graphs (see _compile_decoder)
+COMPILE_DECODER = os.environ.get("QWEN_TTS_COMPILE", "0") == "1"
+
+
+def _compile_decoder(model) -> None:
+    """
+    Compile the per-token decoder forward with torch.compile (CUDA only).
+
+    generate() calls the submodule, not the wrapper, so the forward is
+    replaced in place. A static KV cache keeps allocations stable, which
+    CUDA-graph capture ("reduce-overhead") requires.
+    """
+    hf = model.model
+    target = getattr(hf, "talker", hf)
+    # The cache setting must live on the module being compiled; a talker with
+    # its own generate() reads its own generation_config
+    gen_config = getattr(target, "generation_config", None) or getattr(hf, "generation_config", None)
+    if gen_config is not None:
+        gen_config.cache_implementation = "static"
+    target.forward = torch.compile(target.forward, mode="reduce-overhead", fullgraph=False)
+    logger.info(f"[PATCH] Compiled {type(target).__name__}.forward with torch.compile")
+
+
+@functools.lru_cache(maxsize=1)
+def _lazy_qwen():
+    """
+    Import and return the Qwen3TTSModel class.
+
+    qwen_tts pulls in transformers and friends, so it is imported on first
+    use rather than with this module; servers can call this at startup to
+    take the cost off the first request.
+    """
+    from qwen_tts import Qwen3TTSModel
+
+    return Qwen3TTSModel
+
 
 def _patch_generate_min_tokens(model, min_new_tokens: int = MIN_NEW_TOKENS_DEFAULT):
     """
@@ -40,46 +157,246 @@ def _patch_generate_min_tokens(model, min_new_tokens: int = MIN_NEW_TOKENS_DEFAU
     (especially for certain voices like 'ryan').
     """
     if not hasattr(model, "model") or not hasattr(model.model, "generate"):
-        print(f"[PATCH] Warning: Cannot patch model - no model.model.generate found")
+        logger.warning("[PATCH] Cannot patch model - no model.model.generate found")
         return model
 
     original_generate = model.model.generate
 
-    @functools.wraps(original_generate)
+    # Runs on every generate call: one setdefault + one compare, no wraps()
     def patched_generate(*args, **kwargs):
-        if (
-            "min_new_tokens" not in kwargs
-            or kwargs.get("min_new_tokens", 0) < min_new_tokens
-        ):
+        if kwargs.setdefault("min_new_tokens", min_new_tokens) < min_new_tokens:
             kwargs["min_new_tokens"] = min_new_tokens
-        return original_generate(*args, **kwargs)
+        if not INFERENCE_ONLY:
+            return original_generate(*args, **kwargs)
+        # Unlike no_grad, also skips version-counter bumps on every tensor
+        with torch.inference_mode():
+            return original_generate(*args, **kwargs)
 
     model.model.generate = patched_generate
-    print(
+    logger.info(
         f"[PATCH] Applied min_new_tokens={min_new_tokens} to prevent audio truncation"
     )
+
+    # min_new_tokens injection above stays outside the compiled region
+    if COMPILE_DECODER and _get_device() == "cuda":
+        try:
+            _compile_decoder(model)
+        except Exception as e:
+            logger.warning(f"[PATCH] torch.compile unavailable, running eager: {e}")
     return model
 
 
+# Opt-in: share identical weights between resident variants of one size
+# (assumes weights are never mutated after load)
+DEDUP_SIBLINGS = os.environ.get("QWEN_TTS_DEDUP", "0") == "1"
+
+
+def _dedupe_with_siblings(model_name: str, model) -> int:
+    """
+    Point parameters of `model` at identical ones in already-loaded siblings.
+
+    Siblings are variants of the same size (e.g. 1.7B-CustomVoice and
+    1.7B-Base). A parameter is shared only when name, shape, dtype, device
+    and values all match, so fine-tuned layers keep their own copy.
+
+    Returns:
+        Number of bytes freed
+    """
+    size = model_name.split("-", 1)[0]
+    sibling_params = {}
+    for name, sibling in loaded_models.items():
+        if name.split("-", 1)[0] == size:
+            for key, p in sibling.model.named_parameters():
+                sibling_params.setdefault(key, p)
+    if not sibling_params:
+        return 0
+
+    freed = 0
+    for module_name, module in model.model.named_modules():
+        for key, p in list(module._parameters.items()):
+            if p is None:
+                continue
+            full_key = f"{module_name}.{key}" if module_name else key
+            q = sibling_params.get(full_key)
+            if (
+                q is None
+                or q is p
+                or q.shape != p.shape
+                or q.dtype != p.dtype
+                or q.device != p.device
+                or not torch.equal(q, p)
+            ):
+                continue
+            module._parameters[key] = q
+            freed += p.numel() * p.element_size()
+    return freed
+
+
+# Run a short generation after load so the first request skips autotune
+WARMUP_AFTER_LOAD = os.environ.get("QWEN_TTS_WARMUP", "1") == "1"
+
+
+def _warmup(model, device: str) -> None:
+    """
+    Run one tiny generation so cuDNN/cuBLAS autotuning, CUDA-graph capture
+    and KV-cache allocation happen at load time rather than on the first
+    request. CUDA only; failures are logged and ignored.
+    """
+    if device != "cuda":
+        return
+    torch.backends.cudnn.benchmark = True
+    torch.set_float32_matmul_precision("high")
+    try:
+        # Only CustomVoice models can generate without a reference prompt
+        speakers = model.get_supported_speakers()
+        if not speakers:
+            return
+        with torch.inference_mode():
+            model.generate_custom_voice(
+                text="Hello.",
+                speaker=speakers[0],
+                language="auto",
+                max_new_tokens=MIN_NEW_TOKENS_DEFAULT + 4,
+            )
+        torch.cuda.synchronize()
+        logger.info("[WARMUP] Done")
+    except Exception as e:
+        logger.warning(f"[WARMUP] Skipped: {e}")
+
+
+# Background thread for tokenizer staging
+_STAGING_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tokenizer-stage")
+
 # Shared model cache
 loaded_models: OrderedDict = OrderedDict()
 
 
-def _device_cleanup():
-    """Force device memory cleanup."""
+def _cleanup_cuda():
+    """Collect garbage and release cached CUDA blocks on the active device."""
     gc.collect()
-    if torch.cuda.is_available():
+    # Skip when CUDA was never used, rather than initializing it just to clean up
+    if torch.cuda.is_initialized():
         torch.cuda.empty_cache()
-    elif hasattr(torch, "mps") and hasattr(torch.mps, "empty_cache"):
+
+
+def _cleanup_mps():
+    """Collect garbage and release cached MPS blocks."""
+    gc.collect()
+    if hasattr(torch, "mps") and hasattr(torch.mps, "empty_cache"):
         torch.mps.empty_cache()
 
 
+def _cleanup_cpu():
+    """Collect garbage."""
+    gc.collect()
+
+
+# Force device memory cleanup, resolved once for the detected backend.
+# Expensive (full GC plus allocator cache scan); meant for shutdown or an
+# explicit user action, not for routine model swaps.
+_CLEANUP = {"cuda": _cleanup_cuda, "mps": _cleanup_mps, "cpu": _cleanup_cpu}[_get_device()]
+_device_cleanup = _CLEANUP
+
+
+def _estimate_model_bytes(model_path: str) -> int:
+    """Approximate resident size of a model from its weight files on disk."""
+    return sum(
+        f.stat().st_size
+        for pattern in ("*.safetensors", "*.bin")
+        for f in Path(model_path).rglob(pattern)
+    )
+
+
+def _free_memory(device: str) -> tuple[int, int]:
+    """Return (free, total) bytes usable for new weights on `device`."""
+    if device == "cuda":
+        free, total = torch.cuda.mem_get_info()
+        # Blocks cached by PyTorch's allocator are reusable by the next load
+        free += torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+        return free, total
+    elif device == "mps":
+        total = torch.mps.recommended_max_memory()
+        return total - torch.mps.current_allocated_memory(), total
+    else:
+        import psutil
+
+        vm = psutil.virtual_memory()
+        return vm.available, vm.total
+
+
+def _under_memory_pressure(device: str, required_bytes: int) -> bool:
+    """Whether loading `required_bytes` more would cross MEMORY_FREE_THRESHOLD."""
+    try:
+        free, total = _free_memory(device)
+    except ImportError:
+        # psutil is optional; without it only MAX_MODELS_IN_MEMORY applies
+        return False
+    except Exception:
+        # Can't measure: be conservative and evict
+        return True
+    return free - required_bytes < MEMORY_FREE_THRESHOLD * total
+
+
 def _unload_model(model_name: str) -> None:
     """Unload a model from memory."""
     if model_name in loaded_models:
         del loaded_models[model_name]
-        _device_cleanup()
-        print(f"Unloaded {model_name}")
+        # Drop dead Python refs so their blocks are reusable by the next load;
+        # the allocator keeps the cache, which the replacement model will reuse
+        gc.collect()
+        logger.info(f"Unloaded {model_name}")
+
+
+def _stage_tokenizer(src: Path, dst: Path) -> None:
+    """
+    Make the shared speech tokenizer weights available at `dst`.
+
+    Prefers an absolute symlink, then a hardlink - both keep a single copy on
+    disk and in the page cache across model variants - then an in-kernel
+    copy_file_range (reflink on btrfs/xfs), and only then a userspace copy.
+
+    An existing tokenizer at `dst` is never overwritten: model repos may ship
+    their own. Only a dangling symlink (which holds no data) is replaced.
+    """
+    if dst.exists():
+        if os.path.samefile(dst, src) or dst.stat().st_size == src.stat().st_size:
+            return
+        logger.warning(
+            f"Keeping existing {dst}: it differs from {src} and was not staged by this loader"
+        )
+        return
+    elif dst.is_symlink():
+        dst.unlink()  # dangling link
+    dst.parent.mkdir(exist_ok=True)
+
+    try:
+        os.symlink(os.path.abspath(src), dst)
+        return
+    except OSError:
+        pass
+
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            size = src.stat().st_size
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                copied = 0
+                while copied < size:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+            if copied == size:
+                return
+        except OSError:
+            pass
+
+    shutil.copyfile(src, dst)
 
 
 def get_model(model_name: str):
@@ -96,16 +413,10 @@ def get_model(model_name: str):
         ValueError: If model path doesn't exist
         RuntimeError: If model loading fails
     """
-    if model_name in loaded_models:
+    m = loaded_models.get(model_name)
+    if m is not None:
         loaded_models.move_to_end(model_name)
-        return loaded_models[model_name]
-
-    while len(loaded_models) >= MAX_MODELS_IN_MEMORY:
-        old_name, _ = next(iter(loaded_models.items()))
-        _unload_model(old_name)
-
-    print(f"Loading {model_name}...")
-    from qwen_tts import Qwen3TTSModel
+        return m
 
     model_path = MODEL_PATHS.get(model_name)
     if not model_path:
@@ -116,39 +427,74 @@ def get_model(model_name: str):
     if not os.path.exists(model_path):
         raise ValueError(f"Model not found: {model_path}")
 
-    # Copy tokenizer if needed
+    # Stage tokenizer in the background while older models are evicted and
+    # qwen_tts is imported; from_pretrained reads it, so wait before loading
     tokenizer_src = Path("Qwen3-TTS-Tokenizer-12Hz/model.safetensors")
     speech_tokenizer_dst = Path(model_path) / "speech_tokenizer" / "model.safetensors"
-    if tokenizer_src.exists() and not speech_tokenizer_dst.exists():
-        speech_tokenizer_dst.parent.mkdir(exist_ok=True)
-        shutil.copy(tokenizer_src, speech_tokenizer_dst)
-
-    preferred_dtypes = [torch.bfloat16, torch.float16, torch.float32]
-    last_err = None
+    staging = None
+    if tokenizer_src.exists():
+        staging = _STAGING_EXECUTOR.submit(
+            _stage_tokenizer, tokenizer_src, speech_tokenizer_dst
+        )
 
     device = _get_device()
-    print(f"Using device: {device}")
 
-    for tdtype in preferred_dtypes:
-        try:
-            m = Qwen3TTSModel.from_pretrained(
-                model_path,
-                device_map=device,
-                torch_dtype=tdtype,
-            )
-            try:
-                m.model.eval()
-            except Exception:
-                pass
-            _patch_generate_min_tokens(m)
-            loaded_models[model_name] = m
-            print(f"{model_name} loaded with {tdtype}!")
-            return m
-        except Exception as e:
-            last_err = e
-            _device_cleanup()
+    # Evict least recently used models only while the new one wouldn't fit
+    required_bytes = _estimate_model_bytes(model_path)
+    while loaded_models and (
+        len(loaded_models) >= MAX_MODELS_IN_MEMORY
+        or _under_memory_pressure(device, required_bytes)
+    ):
+        old_name = next(iter(loaded_models))
+        _unload_model(old_name)
+
+    logger.info(f"Loading {model_name}...")
+    Qwen3TTSModel = _lazy_qwen()
+
+    if staging is not None:
+        staging.result()
+
+    tdtype = _preferred_dtype(device)
+    logger.info(f"Using device: {device}")
+
+    def load(dtype):
+        # Dict device_map + low_cpu_mem_usage streams safetensors shards onto
+        # the device instead of materializing the whole model in host RAM first
+        return Qwen3TTSModel.from_pretrained(
+            model_path,
+            device_map={"": device},
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True,
+            use_safetensors=True,
+            **_quantization_kwargs(device, dtype),
+        )
 
-    raise RuntimeError(f"Failed to load {model_name}: {last_err}")
+    try:
+        try:
+            m = load(tdtype)
+        except (TypeError, RuntimeError) as e:
+            # Only a dtype the device turned out not to support warrants a retry
+            if tdtype == torch.float32 or not _is_dtype_error(e):
+                raise
+            logger.warning(f"{tdtype} not supported ({e}), retrying with torch.float32")
+            tdtype = torch.float32
+            m = load(tdtype)
+    except Exception as e:
+        raise RuntimeError(f"Failed to load {model_name}: {e}") from e
+
+    m.model.eval()
+    if device == "cuda" and QUANTIZATION == "fp8" and _apply_fp8(m):
+        logger.info(f"{model_name} weights quantized to fp8")
+    if DEDUP_SIBLINGS and INFERENCE_ONLY:
+        freed = _dedupe_with_siblings(model_name, m)
+        if freed:
+            logger.info(f"{model_name} shares {freed / 2**20:.0f} MiB of weights with loaded siblings")
+    _patch_generate_min_tokens(m)
+    if WARMUP_AFTER_LOAD:
+        _warmup(m, device)
+    loaded_models[model_name] = m
+    logger.info(f"{model_name} loaded with {tdtype}!")
+    return m
 
 
 if __name__ == "__main__":
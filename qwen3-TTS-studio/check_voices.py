@@ -1,6 +1,9 @@
 import requests
-r = requests.get('http://localhost:8001/voices')
-data = r.json()
-print(f"Total voices: {data['count']}")
-for v in data['voices']:
+from example_client import iter_voices
+
+r = requests.get('http://localhost:8001/voices', stream=True)
+count = 0
+for v in iter_voices(r):
+    count += 1
     print(f"  {v['voice_id']} ({v['type']})")
+print(f"Total voices: {count}")
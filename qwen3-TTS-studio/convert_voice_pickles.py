@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Convert saved voice prompts from pickle to safetensors.
+
+Writes prompt.safetensors next to each saved_voices/<voice>/prompt.pkl so
+the API server can load voice tensors directly onto the model device. The original pickle is left in place.
+
+Usage:
+    python convert_voice_pickles.py
+"""
+
+import os
+import pickle
+import sys
+
+# Change to the script's directory to ensure correct paths
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from storage.voice import SAVED_VOICES_DIR, save_prompt_safetensors
+
+
+def main() -> int:
+    if not SAVED_VOICES_DIR.exists():
+        print(f"No saved voices directory at {SAVED_VOICES_DIR}")
+        return 0
+
+    converted = 0
+    failed = 0
+    for voice_dir in sorted(SAVED_VOICES_DIR.iterdir()):
+        pkl_path = voice_dir / "prompt.pkl"
+        if not pkl_path.exists():
+            continue
+        try:
+            with open(pkl_path, "rb") as f:
+                prompt_items = pickle.load(f)
+            out_path = save_prompt_safetensors(prompt_items, voice_dir)
+            print(f"✓ {voice_dir.name}: {out_path}")
+            converted += 1
+        except Exception as e:
+            print(f"✗ {voice_dir.name}: {e}")
+            failed += 1
+
+    print(f"\nConverted {converted} voice(s), {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
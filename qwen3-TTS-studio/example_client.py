@@ -10,9 +10,27 @@ Then in another terminal:
 """
 
 import requests
+import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
-def generate_speech(text, voice_id="serena", output_file="output.wav", format="wav"):
+# Optional faster JSON handling for large voice lists
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shared session: reuses keep-alive connections across calls
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+def generate_speech(text, voice_id="serena", output_file="output.wav", format="wav", log=print):
     """
     Generate speech using the TTS API.
     
@@ -21,6 +39,7 @@ def generate_speech(text, voice_id="serena", output_file="output.wav", format="w
         voice_id: Voice to use (e.g., "Mac_V2", "serena", "ryan")
         output_file: Where to save the audio file
         format: Audio format ("wav", "m4a", "mp3", "ogg", "flac")
+        log: Called with each progress/result line (default: print)
     
     Returns:
         True if successful, False otherwise
@@ -39,56 +58,75 @@ def generate_speech(text, voice_id="serena", output_file="output.wav", format="w
         "max_new_tokens": 512
     }
     
-    print(f"Generating speech with voice '{voice_id}'...")
-    print(f"Text: {text}")
+    log(f"Generating speech with voice '{voice_id}'...")
+    log(f"Text: {text}")
     
     try:
         # Make the API request
-        response = requests.post(api_url, json=payload, timeout=300)
+        response = _SESSION.post(api_url, json=payload, timeout=300, stream=True)
         
         if response.status_code == 200:
-            # Save the audio file
+            # Copy the socket straight into the file through a fixed 64 KiB buffer
+            response.raw.decode_content = True
             with open(output_file, "wb") as f:
-                f.write(response.content)
+                shutil.copyfileobj(response.raw, f, length=1 << 16)
             
             # Print response headers
-            print(f"✓ Success! Audio saved to: {output_file}")
-            print(f"  Voice ID: {response.headers.get('X-Voice-ID')}")
-            print(f"  Voice Type: {response.headers.get('X-Voice-Type')}")
-            print(f"  Sample Rate: {response.headers.get('X-Sample-Rate')} Hz")
-            print(f"  Format: {response.headers.get('X-Audio-Format')}")
+            log(f"✓ Success! Audio saved to: {output_file}")
+            log(f"  Voice ID: {response.headers.get('X-Voice-ID')}")
+            log(f"  Voice Type: {response.headers.get('X-Voice-Type')}")
+            log(f"  Sample Rate: {response.headers.get('X-Sample-Rate')} Hz")
+            log(f"  Format: {response.headers.get('X-Audio-Format')}")
             return True
         else:
-            print(f"✗ Error {response.status_code}: {response.text}")
+            log(f"✗ Error {response.status_code}: {response.text}")
             return False
             
     except requests.exceptions.ConnectionError:
-        print("✗ Could not connect to API server!")
-        print("  Make sure the server is running: python api_server.py")
+        log("✗ Could not connect to API server!")
+        log("  Make sure the server is running: python api_server.py")
         return False
     except Exception as e:
-        print(f"✗ Error: {e}")
+        log(f"✗ Error: {e}")
         return False
 
+def iter_voices(response):
+    """
+    Yield voice dicts from a /voices response.
+
+    Parses incrementally with ijson when installed, so each voice is available
+    as soon as it arrives; otherwise parses the whole body (orjson if present).
+    """
+    if ijson is not None:
+        response.raw.decode_content = True
+        yield from ijson.items(response.raw, "voices.item")
+    else:
+        data = orjson.loads(response.content) if orjson is not None else response.json()
+        yield from data["voices"]
+
+
 def list_voices():
     """List all available voices from the API."""
     api_url = "http://localhost:8001/voices"
     
     try:
-        response = requests.get(api_url)
+        response = _SESSION.get(api_url, stream=True)
         if response.status_code == 200:
-            data = response.json()
-            print(f"\n{data['count']} available voices:")
             print("\nPreset Voices:")
-            for voice in data['voices']:
+            count = 0
+            saved_voices = []
+            for voice in iter_voices(response):
+                count += 1
                 if voice['type'] == 'preset':
                     print(f"  - {voice['voice_id']}")
+                elif voice['type'] == 'saved':
+                    saved_voices.append(voice)
             
-            saved_voices = [v for v in data['voices'] if v['type'] == 'saved']
             if saved_voices:
                 print("\nCustom Voices:")
                 for voice in saved_voices:
                     print(f"  - {voice['voice_id']} ({voice.get('name', '')})")
+            print(f"\n{count} available voices")
             return True
         else:
             print(f"Error: {response.status_code}")
@@ -108,23 +146,35 @@ if __name__ == "__main__":
     
     print("\n" + "=" * 60)
     
-    # Example 1: Generate speech with a preset voice (WAV format)
-    if generate_speech(
-        text="Hello! This is a test of the text to speech API.",
-        voice_id="serena",
-        output_file="example_serena.wav",
-        format="wav"
-    ):
-        print()
-    
-    # Example 2: Generate speech in M4A format
-    if generate_speech(
-        text="This is an example in M4A format.",
-        voice_id="ryan",
-        output_file="example_ryan.m4a",
-        format="m4a"
-    ):
-        print()
+    # Examples 1 and 2 are sent concurrently. They use different formats, so
+    # the server generates them one after the other, but each one's request
+    # and download overlaps the other's generation. Output is collected per
+    # example and printed here so the two don't interleave.
+    examples = [
+        # Example 1: Generate speech with a preset voice (WAV format)
+        dict(
+            text="Hello! This is a test of the text to speech API.",
+            voice_id="serena",
+            output_file="example_serena.wav",
+            format="wav"
+        ),
+        # Example 2: Generate speech in M4A format
+        dict(
+            text="This is an example in M4A format.",
+            voice_id="ryan",
+            output_file="example_ryan.m4a",
+            format="m4a"
+        ),
+    ]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = {}
+        for example in examples:
+            lines = []
+            futures[pool.submit(generate_speech, **example, log=lines.append)] = lines
+        for future in as_completed(futures):
+            future.result()
+            print("\n".join(futures[future]))
+            print()
     
     # Example 3: Generate speech with Mac_V2 in MP3 format (if available)
     # Uncomment this after confirming Mac_V2 is in your saved voices:
@@ -1,6 +1,8 @@
 """Voice selection and speaker profile management for podcast generation."""
 
+import importlib
 import json
+import os
 from pathlib import Path
 from typing import Any
 
@@ -24,12 +26,23 @@ def get_saved_voices() -> list[dict[str, Any]]:
     return sorted(voices, key=lambda x: x.get("created", ""), reverse=True)
 
 
+def saved_voice_entry(voice_id: str, meta: dict[str, Any]) -> dict[str, Any]:
+    """Build the voice list entry for a saved voice from its metadata.json."""
+    return {
+        "voice_id": voice_id,
+        "name": meta.get("name", voice_id),
+        "type": "saved",
+        "created": meta.get("created"),
+        "model": meta.get("model", "1.7B-Base")
+    }
+
+
 def get_available_voices() -> list[dict[str, Any]]:
     """
     Get all available voices (preset + saved).
     
     Returns:
-        List of voice dicts with keys: voice_id, name, type, created (if saved)
+        List of voice dicts with keys: voice_id, name, type, created and model (if saved)
     
     Note: Uses hardcoded preset voices to avoid loading the TTS model.
     Model is only loaded when actually generating audio.
@@ -49,18 +62,95 @@ def get_available_voices() -> list[dict[str, Any]]:
     try:
         saved = get_saved_voices()
         for voice in saved:
-            voices.append({
-                "voice_id": voice.get("id"),
-                "name": voice.get("name", voice.get("id")),
-                "type": "saved",
-                "created": voice.get("created")
-            })
+            voices.append(saved_voice_entry(voice["id"], voice))
     except Exception as e:
         print(f"Warning: Could not load saved voices: {e}")
     
     return voices
 
 
+def save_prompt_safetensors(prompt_items: list[Any], voice_dir: Path) -> Path:
+    """
+    Write a voice clone prompt as prompt.safetensors.
+
+    Tensors are keyed "<index>.<field>"; the item class and its non-tensor
+    fields go into the file's metadata header, so tensors and metadata are
+    replaced together in one atomic rename and a reader never sees a mix of
+    old and new.
+
+    Returns:
+        Path to the written prompt.safetensors
+
+    Raises:
+        ValueError: If prompt_items is empty
+    """
+    from safetensors.torch import save_file
+
+    if not prompt_items:
+        raise ValueError("Cannot save an empty voice clone prompt")
+
+    tensors = {}
+    items_meta = []
+    for i, item in enumerate(prompt_items):
+        tensors[f"{i}.ref_spk_embedding"] = item.ref_spk_embedding.detach().cpu().contiguous()
+        if item.ref_code is not None:
+            tensors[f"{i}.ref_code"] = item.ref_code.detach().cpu().contiguous()
+        items_meta.append({
+            "has_ref_code": item.ref_code is not None,
+            "x_vector_only_mode": item.x_vector_only_mode,
+            "icl_mode": item.icl_mode,
+            "ref_text": item.ref_text,
+        })
+
+    item_type = type(prompt_items[0])
+    meta = {
+        "type": f"{item_type.__module__}:{item_type.__qualname__}",
+        "items": items_meta,
+    }
+
+    prompt_path = voice_dir / "prompt.safetensors"
+    tmp_path = voice_dir / "prompt.safetensors.tmp"
+    save_file(tensors, str(tmp_path), metadata={"prompt_meta": json.dumps(meta)})
+    os.replace(tmp_path, prompt_path)
+    return prompt_path
+
+
+def load_prompt_safetensors(voice_dir: Path, device: Any = "cpu") -> list[Any]:
+    """
+    Load a voice clone prompt written by save_prompt_safetensors.
+
+    Tensors are loaded straight onto `device` without an intermediate CPU
+    object graph. Files converted before the metadata moved into the header
+    are read with their prompt_meta.json sidecar.
+    """
+    from safetensors import safe_open
+
+    with safe_open(str(voice_dir / "prompt.safetensors"), framework="pt", device=str(device)) as f:
+        header = f.metadata() or {}
+        tensors = {key: f.get_tensor(key) for key in f.keys()}
+    if "prompt_meta" in header:
+        meta = json.loads(header["prompt_meta"])
+    else:
+        with open(voice_dir / "prompt_meta.json") as f:
+            meta = json.load(f)
+    if not meta["items"]:
+        return []
+
+    module_name, qualname = meta["type"].split(":", 1)
+    item_type = getattr(importlib.import_module(module_name), qualname)
+
+    return [
+        item_type(
+            ref_code=tensors[f"{i}.ref_code"] if item["has_ref_code"] else None,
+            ref_spk_embedding=tensors[f"{i}.ref_spk_embedding"],
+            x_vector_only_mode=item["x_vector_only_mode"],
+            icl_mode=item["icl_mode"],
+            ref_text=item["ref_text"],
+        )
+        for i, item in enumerate(meta["items"])
+    ]
+
+
 def create_speaker_profile(voice_selections: list[dict[str, str]]) -> SpeakerProfile:
     """
     Create a SpeakerProfile from voice selections.